@@ -0,0 +1,57 @@
+# app.py (integrated with relay_toggle, network, and hardware watchdog)
+# Imported by the main.py shim so it can be shipped precompiled (.mpy).
+import time
+import uasyncio
+from config_loader import load_config
+from relay_toggle import RelayToggle
+from pico_network import NetworkManager
+from message_ring import MessageRing
+
+CONFIG_DEFAULTS = {
+    'config': {
+        'wifi_ssid': '',
+        'wifi_password': '',
+        'target_id': 'default_pico',
+        'UdpPort': 5000,
+        'TcpPort': 5001,
+        'ntpserver': 'pool.ntp.org',
+        'timezone': 0, # Default UTC
+        'debug': False,
+        'power_save': False  # Let the radio doze between bursts of traffic
+    },
+    'devices': []
+}
+
+# Required top-level keys and the keys each must contain
+CONFIG_SCHEMA = {
+    'config': ('wifi_ssid', 'wifi_password', 'target_id', 'UdpPort', 'TcpPort', 'ntpserver', 'timezone'),
+    'devices': None
+}
+
+def run():
+    config = load_config('config.json', CONFIG_SCHEMA, CONFIG_DEFAULTS)
+
+    message_queue = MessageRing(32)  # Shared ring for status updates
+
+    # Setup hardware watchdog (8 seconds timeout)
+    # from machine import WDT  # Import hardware watchdog only when enabled
+    # wdt = WDT(timeout=8000)
+
+    # Setup network (with shared queue); pass full config
+    network_manager = NetworkManager(config, message_queue)
+
+    # Setup relay_toggle (with shared queue, and comm = network_manager for publish if needed)
+    relay_toggle = RelayToggle(network_manager, config['devices'], message_queue)
+    relay_toggle.setup()  # Sets up IRQs
+
+    # Link relay_toggle instance to network_manager
+    network_manager.relay_toggle = relay_toggle
+
+    print("Run Network Loop (uasyncio)")
+    uasyncio.run(network_manager.run_network_loop_async())
+
+    # Keep main thread alive and feed the watchdog. machine.lightsleep would
+    # gate the clock the CYW43 link depends on, so use the tick-based sleep.
+    while True:
+    #    wdt.feed()  # Feed the watchdog to prevent reset
+        time.sleep_ms(1000)
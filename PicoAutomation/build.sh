@@ -0,0 +1,41 @@
+#!/bin/sh
+# build.sh - precompile the Pico firmware modules to .mpy and upload them.
+#
+# MicroPython only runs main.py as source, so main.py stays a tiny shim and
+# everything else is shipped as bytecode; the board then skips lexing and
+# compiling those modules on every boot.
+#
+# Requires mpy-cross and mpremote (pip install mpy-cross mpremote).
+# Usage: ./build.sh [--with-config] [mpremote device, e.g. /dev/ttyACM0]
+#
+# The board's config.json (per-device target_id and Wi-Fi credentials) is left
+# alone unless --with-config is given, e.g. when provisioning a new board.
+set -e
+
+cd "$(dirname "$0")"
+
+MODULES="app.py config_loader.py pico_network.py relay_toggle.py message_ring.py"
+BUILD_DIR=build
+WITH_CONFIG=0
+if [ "$1" = "--with-config" ]; then
+    WITH_CONFIG=1
+    shift
+fi
+DEVICE=${1:-auto}
+
+mkdir -p "$BUILD_DIR"
+for src in $MODULES; do
+    mpy-cross -O3 -march=armv6m -o "$BUILD_DIR/${src%.py}.mpy" "$src"
+    echo "Compiled $src"
+done
+
+for src in $MODULES; do
+    mpremote connect "$DEVICE" cp "$BUILD_DIR/${src%.py}.mpy" ":${src%.py}.mpy"
+    # MicroPython prefers a .py over an .mpy of the same name; drop old sources.
+    mpremote connect "$DEVICE" rm ":$src" 2>/dev/null || true
+done
+mpremote connect "$DEVICE" cp main.py :main.py
+if [ "$WITH_CONFIG" = 1 ]; then
+    mpremote connect "$DEVICE" cp config.json :config.json
+fi
+echo "Deployed to $DEVICE"
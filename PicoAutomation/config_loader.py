@@ -0,0 +1,34 @@
+# config_loader.py
+import json
+
+def load_config(filename, schema, defaults):
+    """
+    Load and validate a JSON config file, falling back to defaults.
+
+    Parameters:
+        filename (str): Path of the JSON config file.
+        schema (dict): Required top-level key -> keys required inside it (or None).
+        defaults (dict): Config returned when the file is missing or invalid.
+    """
+    try:
+        with open(filename, 'r') as f:
+            config = json.load(f)
+        print("Loaded config")
+        # Index the required keys directly; a missing one raises KeyError
+        for key, nested_required in schema.items():
+            section = config[key]
+            for nested_key in nested_required or ():
+                section[nested_key]
+    except OSError:
+        print("File not found. Using defaults.")
+        return defaults
+    except KeyError as e:
+        print(f"Config error: missing key {e}. Using defaults.")
+        return defaults
+    except TypeError:  # the top level or a required section is not an object
+        print("Config error: unexpected structure. Using defaults.")
+        return defaults
+    except ValueError as e:  # MicroPython json raises ValueError for decode errors
+        print(f"Config error: {e}. Using defaults.")
+        return defaults
+    return config
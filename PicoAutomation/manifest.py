@@ -0,0 +1,14 @@
+# manifest.py - freeze the Pico firmware modules into a custom MicroPython image.
+#
+# Frozen bytecode executes in place from flash, so importing these modules
+# costs no heap. Build from a micropython checkout with:
+#   make -C ports/rp2 BOARD=RPI_PICO_W FROZEN_MANIFEST=/path/to/PicoAutomation/manifest.py
+# then flash the resulting firmware.uf2 and copy main.py (and, for a new board,
+# config.json).
+include("$(PORT_DIR)/boards/RPI_PICO_W/manifest.py")
+
+freeze(
+    ".",  # relative to this manifest
+    ("app.py", "config_loader.py", "pico_network.py", "relay_toggle.py", "message_ring.py"),
+    opt=3,
+)
@@ -0,0 +1,57 @@
+# message_ring.py
+from machine import disable_irq, enable_irq
+from uasyncio import ThreadSafeFlag
+
+class MessageRing:
+    """Fixed-size ring of encoded frames with many producers and one consumer.
+
+    Producers are the relay button IRQ (registered hard=True) and code on the
+    event loop; the TCP sender is the only consumer. Every cursor update runs
+    under disable_irq, which holds off the hard IRQ, so push may be called
+    from either side. A soft (scheduled) IRQ must not push: scheduled
+    callbacks run between bytecodes even with IRQs disabled.
+    """
+
+    def __init__(self, size=32):
+        if size <= 0 or size & (size - 1):
+            raise ValueError(f"Ring size must be a power of two: {size}")
+        self.buf = [None] * size  # Preallocated slots
+        self.mask = size - 1
+        self.head = 0  # Next slot to write (producers only)
+        self.tail = 0  # Next slot to read (consumer only)
+        self.ready = ThreadSafeFlag()  # Set on push; IRQ-safe consumer wakeup
+
+    def push(self, msg):
+        """Enqueue a message. When full the oldest message is evicted so the
+        newest state is always delivered; returns False if one was evicted.
+        Allocates nothing, so it is safe in a hard IRQ."""
+        irq_state = disable_irq()  # Only guards the cursor update
+        i = self.head
+        evicted = i - self.tail > self.mask
+        if evicted:
+            self.tail += 1  # Its slot is the one overwritten below
+        self.buf[i & self.mask] = msg
+        self.head = i + 1
+        enable_irq(irq_state)
+        self.ready.set()
+        return not evicted
+
+    def get(self, index):
+        """Return the message at absolute index (tail <= index < head), or
+        None if it has not been pushed yet or was evicted."""
+        irq_state = disable_irq()  # Check and read together vs. an eviction
+        msg = self.buf[index & self.mask] if self.tail <= index < self.head else None
+        enable_irq(irq_state)
+        return msg
+
+    def advance(self, end):
+        """Drop the messages before absolute index end once the consumer is
+        done with them. Messages evicted meanwhile are already gone."""
+        irq_state = disable_irq()
+        t = self.tail
+        end = min(end, self.head)
+        while t < end:
+            self.buf[t & self.mask] = None  # Release the reference for the GC
+            t += 1
+        self.tail = t
+        enable_irq(irq_state)
@@ -2,13 +2,54 @@ import uasyncio as asyncio
 import network
 import socket
 import json
+import binascii
+import random
 import utime
 import time
-import rp2
-from machine import Pin
+import micropython
+import gc
+import ntptime
+from machine import Pin, Timer
+
+HEARTBEAT_MS            = 30000  # Idle interval before a heartbeat is sent to the server
+TX_BATCH                = 16  # Max queued messages coalesced into one TCP write
+RX_BUF_SIZE             = 1024  # Longest inbound TCP line that can be received
+TX_BUF_SIZE             = 1400  # Batch buffer; one write stays within one TCP segment
+JSON_SEPARATORS         = (',', ':')  # Compact JSON on the wire
+TIMESTAMP_LEN           = 25  # len("YYYY-MM-DDTHH:MM:SS+hh:mm")
+WIFI_CONNECT_TIMEOUT_MS = 30000  # Give up one connect_wifi call after this
+WIFI_PM_NONE            = 0x00000000  # CYW43 power management off (mode 0) for low latency
+WIFI_PM_IDLE            = getattr(network.WLAN, "PM_PERFORMANCE", 0xa11142)  # Doze, wake each DTIM
+PM_IDLE_AFTER_MS        = 500  # Quiet time on the link before power_save dozes the radio
+RADIO_RESET_FAILURES    = 5  # Reset the radio after this many failed Wi-Fi joins in a row
+RADIO_OFF_MS            = 250  # Time the CYW43 is held down during _restart_radio
+MIN_SESSION_MS          = HEARTBEAT_MS  # Shorter TCP sessions count as a failed bring-up
+UDP_ACK_TIMEOUT_MS      = 5000  # Wait per announce attempt for the server ACK
+BACKOFF_BASE_MS         = 500  # First retry window for _backoff_ms
+BACKOFF_CAP_MS          = 8000  # Largest retry window for _backoff_ms
+NTP_RETRY_MS            = 300000  # NTP retry interval once the quick attempts are used up
+LOG_FILE                = "bootlog.txt"
+LOG_FLUSH_BYTES         = 1024  # Append buffered debug lines once this much is pending
+LOG_FLUSH_MS            = 30000  # Background flush interval for buffered debug lines
+GC_INTERVAL_MS          = 30000  # Background gc_loop collection interval
+SERVER_CACHE            = "server.json"  # Last server IP from a UDP ACK
+TCP_CONNECT_TIMEOUT_MS  = 3000  # Per attempt; a stale cached server fails fast
+CACHED_TCP_ATTEMPTS     = 2  # Direct tries on the cached server before announcing
+TCP_NODELAY             = getattr(socket, "TCP_NODELAY", None)  # Missing on older lwIP builds
+
+@micropython.viper
+def _find_newline(buf, start: int, end: int) -> int:
+    """Index of the first b'\\n' in buf[start:end], or -1."""
+    p = ptr8(buf)
+    i = start
+    while i < end:
+        if p[i] == 10:
+            return i
+        i += 1
+    return -1
 
 class NetworkManager:
-    def __init__(self, network_config, message_queue, queue_lock):
+    def __init__(self, network_config, message_queue):
         cfg = network_config['config']
         self.ssid            = cfg['wifi_ssid']
         self.password        = cfg['wifi_password']
@@ -16,277 +57,561 @@ class NetworkManager:
         self.udp_port        = cfg['UdpPort']
         self.tcp_port        = cfg['TcpPort']
         self.ntpserver       = cfg.get('ntpserver', 'pool.ntp.org')
+        ntptime.host         = self.ntpserver
         self.timezone_offset = cfg.get('timezone', 0) * 3600
+        sign = "+" if self.timezone_offset >= 0 else "-"
+        hh = abs(int(self.timezone_offset // 3600))
+        mm = abs(int((self.timezone_offset % 3600) // 60))
+        # Timezone is fixed for the session, so bake it into the format
+        self._ts_fmt         = "{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}" + f"{sign}{hh:02d}:{mm:02d}"
+        self._ts_second      = None  # UTC second the cached timestamp renders
+        self._ts_cache       = ""
         self.debug           = cfg.get('debug', False)
+        self.power_save      = cfg.get('power_save', False)  # Doze the radio when idle
+        self._pm             = None  # Last pm value written to the radio
+        self._log_buf        = bytearray()  # Debug lines not yet in LOG_FILE
+        self._log_task       = None  # Background log_flush_loop, started once
+        self.wlan            = network.WLAN(network.STA_IF)  # Station interface, created once
+        self._country_set    = False
         self.ip              = None
         self.macaddress      = None
         self.server_ip       = None
         self.server_tcp_port = None
+        self._load_server_cache()  # Lets a reboot reconnect without announcing
         self.devices         = network_config.get('devices', [])
-        self.message_queue   = message_queue
-        self.queue_lock      = queue_lock
+        self.message_queue   = message_queue  # MessageRing of encoded frames from RelayToggle
+        self.relay_toggle    = None  # Linked by app.run() after RelayToggle setup
+        self.led             = Pin("LED", Pin.OUT)  # Onboard LED (Pico W)
+        self._led_timer      = Timer()
+        self._led_toggles    = 0
+        self._announce_ip    = None  # IP the cached announce pieces belong to
+        self._broadcast_addr = None
+        self._announce_buf   = None  # Encoded announce with a timestamp slot
+        self._announce_ts_at = 0     # Offset of the timestamp slot
+        self._rx_buf         = bytearray(RX_BUF_SIZE)  # Reused TCP receive buffer
+        self._rx_mv          = memoryview(self._rx_buf)
+        self._tx_buf         = bytearray(TX_BUF_SIZE)  # Reused TCP send buffer
+        self._tx_mv          = memoryview(self._tx_buf)
+        self._udp_sock       = None  # Broadcast socket, created on first announce
+        self._udp_stream     = None  # asyncio stream over _udp_sock for ACK reads
+        self._udp_buf        = bytearray(512)  # Reused UDP ACK receive buffer
+        self._udp_mv         = memoryview(self._udp_buf)
         self.time_set        = False  # Track if time has been set
+        self._ntp_task       = None   # Background ntp_sync_loop, started once
+        self._gc_task        = None   # Background gc_loop, started once
+        self._session_start  = 0      # ticks_ms when the last TCP session connected
+        json.dumps(None)  # Warm up json's lazy state before the first loads
+        # Heartbeat and device_info payloads never change, so encode them once
+        self._heartbeat_bytes = json.dumps({
+            "type": "heartbeat",
+            "data": {"target_id": self.target_id}
+        }, separators=JSON_SEPARATORS).encode() + b"\n"
+        relays = [{"device_type": "relay", "label": d['label']}
+                  for d in self.devices if d.get('device_type') == 'relay']
+        self._device_info_bytes = json.dumps({
+            "type": "device_info",
+            "id":   self.target_id,  # Server registers the connection by "id"
+            "data": {"devices": relays}
+        }, separators=JSON_SEPARATORS).encode() + b"\n"
 
     def debug_print(self, *args):
         if self.debug:
             message = ' '.join(str(arg) for arg in args)
             print(message)
-            try:
-                with open("bootlog.txt", "a") as f:
-                    f.write(message + "\n")
-            except Exception as e:
-                print("Failed to write to log file:", e)
+            # Batch file writes: lines are appended on error paths, from
+            # log_flush_loop, or once LOG_FLUSH_BYTES are pending
+            self._log_buf.extend(message.encode())
+            self._log_buf.extend(b"\n")
+            if len(self._log_buf) >= LOG_FLUSH_BYTES:
+                self.flush_log()
+
+    def flush_log(self):
+        """Append the buffered debug lines to LOG_FILE in a single write."""
+        if not self._log_buf:
+            return
+        try:
+            with open(LOG_FILE, "ab") as f:
+                f.write(self._log_buf)
+        except Exception as e:
+            print("Failed to write to log file:", e)
+        self._log_buf = bytearray()
+
+    async def log_flush_loop(self):
+        """Periodically write buffered debug lines while the device runs."""
+        while True:
+            await asyncio.sleep_ms(LOG_FLUSH_MS)
+            self.flush_log()
+
+    async def gc_loop(self):
+        """Collect on a schedule from the event loop instead of mid-allocation."""
+        while True:
+            await asyncio.sleep_ms(GC_INTERVAL_MS)
+            gc.collect()
+            # Collect again early once a quarter of the free heap is used
+            gc.threshold(gc.mem_free() // 4 + gc.mem_alloc())
                 
     def flash_led(self, num_flashes, interval=0.5):
         """
         Flashes the onboard LED on Raspberry Pi Pico W a specified number of times.
+        Returns immediately; a timer drives the blinking in the background.
         
         Parameters:
             num_flashes (int): Number of times to flash the LED.
             interval (float): Time in seconds for each on/off state (default is 0.5 seconds).
         """
-        # Initialize the onboard LED for Pico W
-        led = Pin("LED", Pin.OUT)
-        
-        # Flash the LED the specified number of times
-        for _ in range(num_flashes):
-            led.on()  # Turn LED on
-            utime.sleep(interval)  # Wait
-            led.off()  # Turn LED off
-            utime.sleep(interval)  # Wait
+        self._led_toggles = num_flashes * 2
+        self.led.off()
+        # Soft timer: the Pico W LED sits behind the CYW43, so no hard IRQ
+        self._led_timer.init(mode=Timer.PERIODIC, period=int(interval * 1000),
+                             callback=self._led_tick, hard=False)
+
+    def _led_tick(self, timer):
+        if self._led_toggles <= 0:
+            timer.deinit()
+            self.led.off()
+            return
+        self.led.toggle()
+        self._led_toggles -= 1
         
+    def _backoff_ms(self, attempt):
+        """Full-jitter exponential backoff: a random delay in [0, window) ms,
+        where the window doubles per attempt (from 1) up to BACKOFF_CAP_MS.
+        Keeps a fleet of boards that lost power together from retrying in step."""
+        window = min(BACKOFF_CAP_MS, BACKOFF_BASE_MS << min(attempt, 8))
+        return random.getrandbits(16) % window
+
     def current_timestamp(self):
         utc = time.time()
-        tm  = time.localtime(utc + self.timezone_offset)
-        sign = "+" if self.timezone_offset >= 0 else "-"
-        hh = abs(int(self.timezone_offset // 3600))
-        mm = abs(int((self.timezone_offset % 3600) // 60))
-        tz = f"{sign}{hh:02d}:{mm:02d}"
-        return "{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}{}".format(
-            tm[0], tm[1], tm[2], tm[3], tm[4], tm[5], tz
-        )
-
-    def set_time(self):
-        """Attempt to set the time via NTP. Set flag if successful."""
-        import ntptime
+        if utc != self._ts_second:  # Re-render at most once per second
+            tm  = time.localtime(utc + self.timezone_offset)
+            self._ts_cache = self._ts_fmt.format(tm[0], tm[1], tm[2], tm[3], tm[4], tm[5])
+            self._ts_second = utc
+        return self._ts_cache
+
+    async def ntp_sync_loop(self):
+        """Set the time via NTP in the background, retrying until it succeeds."""
         self.debug_print("Setting Time:")
-        ntptime.host = self.ntpserver
-        for attempt in range(1, 6):
+        attempt = 0
+        while not self.time_set:
+            attempt += 1
             try:
                 ntptime.settime()
                 self.debug_print(f"NTP time set successfully on attempt {attempt}")
                 self.time_set = True
-                return True
+                self._ts_second = None  # Drop the timestamp rendered from the old clock
             except Exception as e:
                 self.debug_print(f"NTP settime failed (attempt {attempt}):", e)
-                utime.sleep(1)
-        self.debug_print("NTP time sync failed after 5 attempts. Continuing with current time.")
-        return False
+                # A few quick retries, then back off to a slow background pace
+                await asyncio.sleep_ms(self._backoff_ms(attempt) if attempt < 5 else NTP_RETRY_MS)
 
-    def connect_wifi(self):
+    async def connect_wifi(self):
         self.flash_led(5, 0.1)
-        rp2.country("US")  # Set country code for Wi-Fi
-        network.country("US")   
-        wlan = network.WLAN(network.STA_IF)
-        wlan.config(pm=0x00000000)
+        if not self._country_set:
+            import rp2  # Only needed for this one-time radio setup
+            rp2.country("US")  # Set country code for Wi-Fi
+            network.country("US")
+            self._country_set = True
+        wlan = self.wlan
+        self._set_pm(WIFI_PM_NONE, True)
+        wlan.active(True)
+        if self.macaddress is None:  # Fixed for the hardware; format it once
+            self.macaddress = binascii.hexlify(wlan.config('mac'), ':').decode()
         if wlan.isconnected():
+            self._set_pm(WIFI_PM_NONE, True)  # May have reverted after a reconnect
             self.ip = wlan.ifconfig()[0]
             self.debug_print("Already connected. WiFi IP:", self.ip)
-            # Only set time if not already set
-            if not self.time_set:
-                self.set_time()
             return True
-        wlan.active(True)
-        mac = wlan.config('mac')
-        self.macaddress = ':'.join(['{:02x}'.format(b) for b in mac])
         wlan.connect(self.ssid, self.password)
         self.debug_print("WiFi Attempting to Connect")
+        last_status = None
+        retries = 0  # Join failures seen by this call; picks the recovery step
+        deadline = utime.ticks_add(utime.ticks_ms(), WIFI_CONNECT_TIMEOUT_MS)
         while not wlan.isconnected():
+            if utime.ticks_diff(deadline, utime.ticks_ms()) <= 0:
+                self.debug_print("WiFi connect timed out.")
+                return False
             status = wlan.status()
-            self.debug_print(f"Status: {status}")
+            if status != last_status:  # Only log transitions, not every poll
+                self.debug_print(f"Status: {status}")
+                last_status = status
             if status in (-1, -2):
                 self.flash_led(abs(status), 0.1)
-                wlan.active(False)
-                utime.sleep(0.5)
-                wlan.active(True)
-                utime.sleep(0.5)
+                retries += 1
+                if retries == 1:
+                    wlan.disconnect()  # Usually a transient AP glitch; just rejoin
+                else:
+                    await self._restart_radio()  # Still failing: reset the radio
+                await asyncio.sleep_ms(self._backoff_ms(retries))
                 wlan.connect(self.ssid, self.password)
-                self.debug_print("WiFi Attempting to Connect Again")
-            utime.sleep(0.5)
+                self.debug_print(f"WiFi Attempting to Connect Again (retry {retries})")
+                last_status = None
+            await asyncio.sleep_ms(250)  # Yield to the event loop while joining
+        self._set_pm(WIFI_PM_NONE, True)  # The join can restore the default power mode
         self.ip = wlan.ifconfig()[0]
         self.debug_print("WiFi IP:", self.ip)
-        # Only set time if not already set
-        if not self.time_set:
-            self.set_time()
         return True
 
-    def udp_announce(self):
+    def _set_pm(self, mode, force=False):
+        """Write a CYW43 power mode, skipping the driver call if already set."""
+        if force or mode != self._pm:
+            self.wlan.config(pm=mode)
+            self._pm = mode
+
+    async def _restart_radio(self):
+        """Reset the CYW43: deinit the driver, which powers the chip down, then
+        bring it back up and wait until the link reports idle."""
+        wlan = self.wlan
+        # The LED is a CYW43 GPIO: a flash still running would power the
+        # chip back up mid-reset, so stop it before taking the radio down
+        self._led_timer.deinit()
+        self._led_toggles = 0
+        self.led.off()
+        try:
+            wlan.active(False)
+            wlan.deinit()  # Unlike active(False) alone, this resets the chip
+            await asyncio.sleep_ms(RADIO_OFF_MS)
+            wlan.active(True)  # Re-inits the driver and reloads the chip firmware
+        except Exception as e:  # Never let a failed reset stop the network loop
+            self.debug_print("WiFi radio reset failed:", e)
+            return
+        for _ in range(15):  # Up to 3 s; the CYW43 is normally up much sooner
+            if wlan.active() and wlan.status() == network.STAT_IDLE:
+                return
+            await asyncio.sleep_ms(200)
+        self.debug_print("WiFi radio not ready after reset.")
+
+    def _cache_announce(self):
+        """Build the broadcast address and static announce bytes for self.ip."""
         msg = {
             "action":    "announce",
             "id":        self.target_id,
             "ip":        self.ip,
             "mac":       self.macaddress,
-            "timestamp": self.current_timestamp()
+            "timestamp": "@TS@"  # Placeholder, split out below
         }
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        broadcast = self.ip.rsplit('.', 1)[0] + '.255'
+        prefix, suffix = json.dumps(msg, separators=JSON_SEPARATORS).encode().split(b"@TS@")
+        self._announce_buf = bytearray(prefix + b"0" * TIMESTAMP_LEN + suffix)
+        self._announce_ts_at = len(prefix)
+        self._broadcast_addr = (self.ip.rsplit('.', 1)[0] + '.255', self.udp_port)
+        self._announce_ip = self.ip
+
+    async def udp_announce(self):
+        if self._announce_ip != self.ip:
+            self._cache_announce()
+        payload = self._announce_buf
+        ts_at = self._announce_ts_at
+        broadcast_addr = self._broadcast_addr
+        sock = self._udp_sock
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            sock.setblocking(False)  # Waited on via uasyncio's IO queue, never blocks
+            self._udp_stream = asyncio.StreamReader(sock)
+            self._udp_sock = sock
         for attempt in range(1, 6):
             try:
-                self.debug_print(f"UDP announce attempt {attempt} → {broadcast}")
-                sock.sendto(json.dumps(msg).encode(), (broadcast, self.udp_port))
-                sock.settimeout(5)
-                data, _ = sock.recvfrom(1024)
-                resp = json.loads(data.decode())
-                if resp.get("action") == "ack" and resp.get("id") == self.target_id:
-                    self.server_ip = resp.get("Serverip")
-                    self.server_tcp_port = resp.get("Serverport")
-                    self.debug_print("Got ACK:", json.dumps(resp))
-                    sock.close()
-                    return True
+                self.debug_print(f"UDP announce attempt {attempt} → {broadcast_addr[0]}")
+                # Splice a fresh timestamp into the fixed-width slot
+                payload[ts_at:ts_at + TIMESTAMP_LEN] = self.current_timestamp().encode()
+                sock.sendto(payload, broadcast_addr)
+                if await self._wait_for_ack(UDP_ACK_TIMEOUT_MS):
+                    return True  # Keep the socket for the next announce
+                self.debug_print(f"UDP announce got no ACK (attempt {attempt})")
             except OSError as e:
                 self.debug_print(f"UDP announce failed (attempt {attempt}):", e)
-                utime.sleep(1)
+                self.flush_log()
+            await asyncio.sleep_ms(self._backoff_ms(attempt))
+        # Recreate the socket next time in case the interface went away
         sock.close()
+        self._udp_sock = None
+        self._udp_stream = None
         return False
 
-    async def tcp_receive_loop(self, reader):
+    async def _wait_for_ack(self, timeout_ms):
+        """Wait for our ACK on the UDP socket, parked on uasyncio's IO queue."""
+        deadline = utime.ticks_add(utime.ticks_ms(), timeout_ms)
         while True:
+            remaining = utime.ticks_diff(deadline, utime.ticks_ms())
+            if remaining <= 0:
+                return False
+            # No recvfrom_into on MicroPython; readinto fills the same
+            # buffer each time and the sender address is not needed
             try:
-                line = await reader.readline()
-                if not line:
-                    self.debug_print("TCP disconnected by server.")
-                    break
+                n = await asyncio.wait_for_ms(self._udp_stream.readinto(self._udp_buf), remaining)
+            except asyncio.TimeoutError:
+                return False
+            if not n:
+                continue  # Spurious wakeup with no datagram
+            try:
+                resp = json.loads(self._udp_mv[:n])
+            except ValueError:
+                continue  # Not JSON, keep waiting
+            if not isinstance(resp, dict):
+                continue  # Valid JSON but not a message object
+            if resp.get("action") == "ack" and resp.get("id") == self.target_id:
+                self.server_tcp_port = resp.get("Serverport")
+                server_ip = resp.get("Serverip")
+                if server_ip != self.server_ip:
+                    self.server_ip = server_ip
+                    self._save_server_cache()  # Only touch flash on a change
+                self.debug_print("Got ACK:", json.dumps(resp))
+                return True
 
-                # Parse the JSON message
-                msg = json.loads(line.decode())
+    def _load_server_cache(self):
+        try:
+            with open(SERVER_CACHE) as f:
+                cached = json.load(f)
+            self.server_ip = cached["ip"]
+        except (OSError, ValueError, KeyError):
+            pass  # No usable cache; discover the server over UDP
 
-                # Validate required fields
-                if "type" not in msg or "data" not in msg:
-                    self.debug_print("Invalid message format:", msg)
-                    continue
+    def _save_server_cache(self):
+        try:
+            with open(SERVER_CACHE, "w") as f:
+                # Only the IP: TCP always connects on the configured TcpPort
+                f.write(json.dumps({"ip": self.server_ip}, separators=JSON_SEPARATORS))
+        except OSError as e:
+            self.debug_print("Server cache not written:", e)
 
-                # Handle message types
-                message_type = msg["type"]
-                if message_type == "status":
-                    self.handle_status_message(msg["data"])
-                elif message_type == "command":
-                    self.handle_command_message(msg["data"])
-                elif message_type == "heartbeat":
-                    self.handle_heartbeat_message(msg["data"])
-                else:
-                    self.debug_print(f"Unknown message type: {message_type}")
+    async def tcp_receive_loop(self, reader):
+        # Lines are read into one preallocated buffer and parsed in place,
+        # so the receive path does not allocate a bytes object per chunk.
+        loads = json.loads
+        buf = self._rx_buf
+        mv = self._rx_mv
+        length = 0  # Bytes currently buffered
+        skipping = False  # Inside an overlong line; drop bytes up to its newline
+        while True:
+            try:
+                if length == RX_BUF_SIZE:
+                    self.debug_print("TCP line exceeds receive buffer, discarding.")
+                    length = 0
+                    skipping = True
+                n = await reader.readinto(mv[length:])
+                if not n:
+                    self.debug_print("TCP disconnected by server.")
+                    break
+                self._set_pm(WIFI_PM_NONE)  # Server is talking; stay awake for the reply
+                if self.power_save:
+                    self.message_queue.ready.set()  # Restart the sender's idle countdown
+                scan = length
+                length += n
+                start = 0
+                while True:
+                    end = _find_newline(buf, scan, length)
+                    if end < 0:
+                        break
+                    if skipping:
+                        skipping = False  # Tail of the overlong line; resume after it
+                    elif end > start:
+                        # Parse the JSON message (json.loads takes any buffer)
+                        self.handle_message(loads(mv[start:end]))
+                    start = scan = end + 1
+                if skipping:
+                    length = 0  # Still inside the overlong line
+                elif start:
+                    # Keep the partial line at the front of the buffer
+                    length -= start
+                    mv[:length] = buf[start:start + length]
             except Exception as e:
                 self.debug_print("TCP receive error:", e)
+                self.flush_log()
                 break
+        self.message_queue.ready.set()  # Wake tcp_send_loop so it sees we are done
 
-    async def tcp_send_loop(self, writer):
-        while True:
-            # Wait for a message to send (simulate with a queue)
-            if self.message_queue:
-                self.queue_lock.acquire()
+    def handle_message(self, msg):
+        """Validate a parsed server message and dispatch it by type."""
+        # Validate required fields
+        if "type" not in msg or "data" not in msg:
+            self.debug_print("Invalid message format:", msg)
+            return
+
+        # Handle message types
+        message_type = msg["type"]
+        if message_type == "status":
+            self.handle_status_message(msg["data"])
+        elif message_type == "command":
+            self.handle_command_message(msg["data"])
+        elif message_type == "heartbeat":
+            self.handle_heartbeat_message(msg["data"])
+        else:
+            self.debug_print(f"Unknown message type: {message_type}")
+
+    async def tcp_send_loop(self, writer, receiver):
+        queue = self.message_queue
+        while not receiver.done():  # Session ends when the receive loop does
+            # Peek, and only dequeue once the write has drained: if the
+            # socket fails the message stays queued for the next connection.
+            # Indices are absolute so a push that evicts mid-batch cannot
+            # shift which messages the final advance releases.
+            start = queue.tail
+            msg = queue.get(start)
+            if msg is None:
+                idle_ms = HEARTBEAT_MS
+                if self.power_save and self._pm != WIFI_PM_IDLE:
+                    # Stay fully awake briefly after traffic, then doze
+                    try:
+                        await asyncio.wait_for_ms(queue.ready.wait(), PM_IDLE_AFTER_MS)
+                        continue
+                    except asyncio.TimeoutError:
+                        self._set_pm(WIFI_PM_IDLE)
+                        idle_ms -= PM_IDLE_AFTER_MS
                 try:
-                    msg = self.message_queue.pop(0)
-                finally:
-                    self.queue_lock.release()
-                writer.write((json.dumps(msg) + "\n").encode())
-                await writer.drain()
-                self.debug_print("Sent to server:", msg)
-            await asyncio.sleep(0.1)  # Prevent busy loop
+                    await asyncio.wait_for_ms(queue.ready.wait(), idle_ms)  # Woken by the next push
+                except asyncio.TimeoutError:
+                    if not self.wlan.isconnected():
+                        # A dead link can leave the socket open for minutes
+                        self.debug_print("WiFi link lost. Ending TCP session.")
+                        break
+                    writer.write(self._heartbeat_bytes)
+                    await writer.drain()
+                continue
+            self._set_pm(WIFI_PM_NONE)  # Work queued; leave power save for the burst
+            # Coalesce what is queued (up to TX_BATCH) into one write by
+            # copying the already newline-terminated frames into _tx_buf.
+            buf = self._tx_buf
+            used = 0
+            count = 0
+            while count < TX_BATCH:
+                frame = queue.get(start + count)
+                if frame is None or used + len(frame) > TX_BUF_SIZE:
+                    break
+                buf[used:used + len(frame)] = frame
+                used += len(frame)
+                count += 1
+            if count:
+                writer.write(self._tx_mv[:used])
+            else:
+                writer.write(msg)  # Larger than the buffer, send it alone
+                count = 1
+            await writer.drain()
+            queue.advance(start + count)
+            if self.debug:  # Per-batch path: skip the call entirely when off
+                self.debug_print("Sent to server:", count, "message(s)")
 
-    async def tcp_run_async(self):
-        for attempt in range(1, 6):
+    async def tcp_run_async(self, attempts=5):
+        for attempt in range(1, attempts + 1):
             try:
                 self.debug_print(f"TCP connect attempt {attempt} → {self.server_ip}:{self.tcp_port}")
-                reader, writer = await asyncio.open_connection(self.server_ip, self.tcp_port)
+                reader, writer = await asyncio.wait_for_ms(
+                    asyncio.open_connection(self.server_ip, self.tcp_port),
+                    TCP_CONNECT_TIMEOUT_MS)
                 self.debug_print("TCP connection established (async).")
-                # Run send and receive loops concurrently
-                await asyncio.gather(
-                    self.tcp_receive_loop(reader),
-                    self.tcp_send_loop(writer)
-                )
-                writer.close()
-                await writer.wait_closed()
+                self._session_start = utime.ticks_ms()
+                if TCP_NODELAY is not None:
+                    # Status frames are tiny; send each batch without Nagle delay
+                    try:
+                        writer.s.setsockopt(socket.IPPROTO_TCP, TCP_NODELAY, 1)
+                    except OSError as e:
+                        self.debug_print("TCP_NODELAY not set:", e)
+                writer.write(self._device_info_bytes)
+                await writer.drain()
+                # Run send and receive loops concurrently. The sender stops
+                # when the receiver task finishes (server closed / rx error);
+                # a send error cancels the receiver on the way out.
+                receiver = asyncio.create_task(self.tcp_receive_loop(reader))
+                try:
+                    await self.tcp_send_loop(writer, receiver)
+                finally:
+                    receiver.cancel()
+                    writer.close()
+                    await writer.wait_closed()
                 return True
             except Exception as e:
                 self.debug_print(f"TCP async error (attempt {attempt}):", e)
-                await asyncio.sleep(2)
+                self.flush_log()
+                await asyncio.sleep_ms(self._backoff_ms(attempt))
         return False
 
     async def run_network_loop_async(self):
+        if self.debug and self._log_task is None:
+            self._log_task = asyncio.create_task(self.log_flush_loop())
+        failures = 0  # Consecutive failed bring-ups, drives the backoff
+        wifi_failures = 0  # Consecutive connect_wifi failures; only these reset the radio
         while True:
-            # Wi-Fi connect (sync)
-            if not self.connect_wifi():
-                self.debug_print("WiFi not connected. Retrying in 2 seconds...")
-                await asyncio.sleep(2)
+            # Wi-Fi connect (async)
+            if not await self.connect_wifi():
+                failures += 1
+                wifi_failures += 1
+                self.debug_print("WiFi not connected.")
+                await self._back_off(failures, wifi_failures)
                 continue
+            wifi_failures = 0
+
+            # NTP in the background (async); never holds up the bring-up
+            if self._ntp_task is None and not self.time_set:
+                self._ntp_task = asyncio.create_task(self.ntp_sync_loop())
+            if self._gc_task is None:
+                self._gc_task = asyncio.create_task(self.gc_loop())
 
-            # UDP announce (sync)
-            if not self.udp_announce():
+            # Known server (cached or from the last ACK): connect directly
+            # and only fall back to UDP discovery if that fails
+            if self.server_ip is not None:
+                if await self.tcp_run_async(CACHED_TCP_ATTEMPTS):
+                    failures = await self._after_session(failures)
+                    continue
+                self.debug_print("Cached server unreachable. Announcing over UDP.")
+
+            # UDP announce (async)
+            if not await self.udp_announce():
+                failures += 1
                 self.debug_print("UDP announce failed. Restarting network loop.")
-                await asyncio.sleep(2)
+                await self._back_off(failures)
                 continue
 
             # TCP run loop (async)
             if not await self.tcp_run_async():
+                failures += 1
                 self.debug_print("TCP connection failed. Restarting network loop.")
-                await asyncio.sleep(2)
+                await self._back_off(failures)
                 continue
+            failures = await self._after_session(failures)
 
-    def connect_wifi_with_backoff(self):
-        backoff = 1  # Start with 1 second
-        max_backoff = 30  # Cap at 30 seconds
-        while True:
-            if self.connect_wifi():
-                return True
-            self.debug_print(f"Wi-Fi connection failed. Retrying in {backoff} seconds...")
-            utime.sleep(backoff)
-            backoff = min(backoff * 2, max_backoff)  # Exponential backoff
-
-    def udp_announce_with_backoff(self):
-        backoff = 1  # Start with 1 second
-        max_backoff = 30  # Cap at 30 seconds
-        failed_attempts = 0
-        while True:
-            if self.udp_announce():
-                return True
-            failed_attempts += 1
-            if failed_attempts >= 10:
-                self.debug_print("Pausing UDP announcements for 1 minute...")
-                utime.sleep(60)  # Pause for 1 minute
-                failed_attempts = 0
-            else:
-                self.debug_print(f"UDP announcement failed. Retrying in {backoff} seconds...")
-                utime.sleep(backoff)
-                backoff = min(backoff * 2, max_backoff)  # Exponential backoff
+    async def _after_session(self, failures):
+        """Return the failure count after a TCP session ends. Only a session of
+        at least MIN_SESSION_MS resets it; a server that accepts and then drops
+        the connection is backed off like any other failure."""
+        if utime.ticks_diff(utime.ticks_ms(), self._session_start) >= MIN_SESSION_MS:
+            return 0  # A session ran; start the next reconnect fresh
+        failures += 1
+        self.debug_print("TCP session ended early.")
+        await self._back_off(failures)
+        return failures
+
+    async def _back_off(self, failures, wifi_failures=0):
+        """Wait out a failed bring-up, power-cycling the radio if Wi-Fi joins
+        keep failing. Server-side failures (announce, TCP) only back off."""
+        if wifi_failures and wifi_failures % RADIO_RESET_FAILURES == 0:
+            self.debug_print(f"{wifi_failures} WiFi failures in a row. Restarting WiFi radio.")
+            await self._restart_radio()
+            self._set_pm(WIFI_PM_NONE, True)  # The reset restores the default mode
+        delay = self._backoff_ms(failures)
+        self.debug_print(f"Retrying in {delay} ms...")
+        await asyncio.sleep_ms(delay)
 
     def handle_status_message(self, data):
         """Handle status messages from the server."""
-        self.debug_print("Status message received:", data)
+        if self.debug:
+            self.debug_print("Status message received:", data)
         # Process status updates here (e.g., log or update local state)
 
     def handle_command_message(self, data):
         """Handle command messages from the server."""
-        self.debug_print("Command message received:", data)
+        if self.debug:
+            self.debug_print("Command message received:", data)
         devices = data.get("devices", [])
+        toggle_relay = self.relay_toggle.toggle_relay  # Bind once per command
         for device in devices:
             if device.get("device_type") == "relay":
                 label = device.get("label")
                 state = device.get("state")
                 if label and state:
-                    self.relay_toggle.toggle_relay(label, state)
+                    toggle_relay(label, state)
                 else:
                     self.debug_print("Invalid relay command:", device)
 
     def handle_heartbeat_message(self, data):
         """Handle heartbeat messages from the server."""
-        self.debug_print("Heartbeat message received:", data)
+        if self.debug:
+            self.debug_print("Heartbeat message received:", data)
         # Optionally, send a response or log the heartbeat
-
-    async def tcp_run_with_recovery(self):
-        while True:
-            if await self.tcp_run_async():
-                return True
-            self.debug_print("TCP connection failed. Retrying...")
-            await asyncio.sleep(5)  # Retry after 5 seconds
-
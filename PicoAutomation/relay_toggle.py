@@ -1,15 +1,34 @@
 # relay_toggle.py
 from machine import Pin
+from array import array
+import json
 import time
-import uasyncio
+import micropython
+
+micropython.alloc_emergency_exception_buf(100)  # Report errors raised in the hard IRQ
+
+def _status_frame(label, state_str):
+    """Encode a status message for one relay as a newline-terminated frame."""
+    return json.dumps({
+        "type": "status",
+        "data": {
+            "devices": [{"device_type": "relay", "label": label, "state": state_str}]
+        }
+    }, separators=(',', ':')).encode() + b"\n"
 
 class RelayToggle:
-    def __init__(self, comm, device_configs, message_queue, queue_lock):  # Changed relay_configs to device_configs
+    def __init__(self, comm, device_configs, message_queue):  # Changed relay_configs to device_configs
         """Initialize buttons and relays based on configurations."""
         self.comm = comm  # Network communication object (optional, can be set later)
-        self.relays = []  # Keep as relays for now, but filter by device_type
-        self.message_queue = message_queue  # Shared with network
-        self.queue_lock = queue_lock  # Shared lock for thread-safety
+        # Per-relay state is kept in parallel sequences indexed by relay number,
+        # so the IRQ path indexes arrays instead of hashing dict keys
+        self.buttons = []
+        self.relays = []  # Relay output Pins
+        self.labels = []
+        self.frames = []  # (frame_off, frame_on), indexed by state
+        self._by_pin = {}  # id(button Pin) -> relay index, for O(1) IRQ dispatch
+        self._by_label = {}  # label -> relay index, for O(1) command dispatch
+        self.message_queue = message_queue  # MessageRing shared with network
         self.debounce_ms = 200
 
         print("Initializing RelayToggle")
@@ -26,84 +45,72 @@ class RelayToggle:
                     relay = Pin(relay_pin, Pin.OUT)
                     relay.value(0)  # Initial off
 
-                    self.relays.append({
-                        'button': button,
-                        'relay': relay,
-                        'label': label,
-                        'state': False,  # Initial state False (off)
-                        'last_press': 0
-                    })
+                    index = len(self.labels)
+                    self.buttons.append(button)
+                    self.relays.append(relay)
+                    self.labels.append(label)
+                    # Status frames are fixed per relay/state: encode once so
+                    # enqueueing from the IRQ handler never builds JSON
+                    self.frames.append((_status_frame(label, "off"), _status_frame(label, "on")))
+                    self._by_pin[id(button)] = index
+                    self._by_label[label] = index
 
                     print(f"Initialized relay: {label} | Button GP{button_pin} | Relay GP{relay_pin}")
                 except Exception as e:
                     print(f"Error initializing {config.get('label', 'unknown')}: {e}")
 
-    def get_relay_state(self, relay_info):
+        count = len(self.labels)
+        self.states = bytearray(count)  # 0 = off, 1 = on; all relays start off
+        self.last_press = array('i', [0] * count)  # ticks_ms of the last accepted press
+
+    def get_relay_state(self, index):
         """Return a formatted string of the relay's state."""
-        return f"{relay_info['label']} {'on' if relay_info['state'] else 'off'}"  # Changed to lowercase
+        return f"{self.labels[index]} {'on' if self.states[index] else 'off'}"  # Changed to lowercase
+
+    def enqueue(self, frame):
+        """Push an encoded status frame to the shared ring; evicts the oldest if full."""
+        if not self.message_queue.push(frame):
+            print("Message queue full, dropped oldest status")
 
+    @micropython.native  # Runs on every edge, including switch bounce
     def button_handler(self, pin):
-        """Handle button press via IRQ."""
+        """Handle button press via hard IRQ; must not allocate."""
         current_time = time.ticks_ms()
-        for relay_info in self.relays:
-            if relay_info['button'] == pin:
-                if (current_time - relay_info['last_press']) > self.debounce_ms:
-                    # Confirm it's still pressed
-                    if pin.value() == 1:
-                        relay_info['state'] = not relay_info['state']
-                        relay_info['relay'].value(relay_info['state'])
-                        relay_info['last_press'] = current_time
-                        # Standardized message with "devices" array
-                        state_str = "on" if relay_info['state'] else "off"
-                        message = {
-                            "type": "status",
-                            "data": {
-                                "devices": [{"device_type": "relay", "label": relay_info['label'], "state": state_str}]
-                            }
-                        }
-                        print(f"Toggled: {relay_info['label']} to {state_str}")
-                        with self.queue_lock:
-                            self.message_queue.append(message)
-                break
+        index = self._by_pin.get(id(pin))
+        if index is None:
+            return
+        if time.ticks_diff(current_time, self.last_press[index]) > self.debounce_ms:
+            # Confirm it's still pressed
+            if pin.value() == 1:
+                state = self.states[index] ^ 1
+                self.states[index] = state
+                self.relays[index].value(state)
+                self.last_press[index] = current_time
+                # Pre-encoded status frame; push directly, an eviction is not reported here
+                self.message_queue.push(self.frames[index][state])
 
     def toggle_relay(self, label, state_str):
         """Toggle relay by label and state (for server commands), enqueue status."""
-        for relay_info in self.relays:
-            if relay_info['label'] == label:
-                state = (state_str.lower() == "on")  # Handle case-insensitivity
-                relay_info['state'] = state
-                relay_info['relay'].value(state)
-                # Standardized message with "devices" array
-                state_str_lower = "on" if state else "off"
-                message = {
-                    "type": "status",
-                    "data": {
-                        "devices": [{"device_type": "relay", "label": label, "state": state_str_lower}]
-                    }
-                }
-                print(f"Command toggled: {label} to {state_str_lower}")
-                with self.queue_lock:
-                    self.message_queue.append(message)
-                return True
-        print(f"Relay not found: {label}")
-        return False
+        index = self._by_label.get(label)
+        if index is None:
+            print(f"Relay not found: {label}")
+            return False
+        state = 1 if state_str.lower() == "on" else 0  # Handle case-insensitivity
+        self.states[index] = state
+        self.relays[index].value(state)
+        print(f"Command toggled: {label} to {'on' if state else 'off'}")
+        self.enqueue(self.frames[index][state])  # Pre-encoded status frame
+        return True
 
     def setup(self):
         """Set up IRQ handlers and initial messages."""
         print("Setting up IRQs for relays")
-        for relay_info in self.relays:
+        for index in range(len(self.labels)):
             try:
-                relay_info['button'].irq(trigger=Pin.IRQ_RISING, handler=self.button_handler)
+                # hard=True so the ring's disable_irq sections exclude the handler
+                self.buttons[index].irq(trigger=Pin.IRQ_RISING, handler=self.button_handler, hard=True)
                 # Enqueue initial standardized status with "devices" array
-                state_str = "on" if relay_info['state'] else "off"
-                message = {
-                    "type": "status",
-                    "data": {
-                        "devices": [{"device_type": "relay", "label": relay_info['label'], "state": state_str}]
-                    }
-                }
-                print(f"Initial state: {relay_info['label']} {state_str}")
-                with self.queue_lock:
-                    self.message_queue.append(message)
+                print(f"Initial state: {self.get_relay_state(index)}")
+                self.enqueue(self.frames[index][self.states[index]])
             except Exception as e:
-                print(f"IRQ setup failed for {relay_info['label']}: {e}")
+                print(f"IRQ setup failed for {self.labels[index]}: {e}")
@@ -1,5 +1,6 @@
 ﻿using System;
 using System.Collections.Concurrent;
+using System.IO;
 using System.Linq;
 using System.Net;
 using System.Net.Sockets;
@@ -136,17 +137,18 @@ namespace RVNetworkLibrary.Services
         {
             using (client)
             using (var stream = client.GetStream())
+            using (var reader = new StreamReader(stream, Encoding.UTF8))
             {
-                var buffer = new byte[1024];
                 string picoId = null;
                 try
                 {
-                    // Read initial config/status message to get Pico ID
-                    int bytesRead = await stream.ReadAsync(buffer, 0, buffer.Length);
-                    if (bytesRead > 0)
+                    // Messages are newline-delimited JSON. Read the first line
+                    // (device_info) on its own: the Pico may send its queued
+                    // status frames right behind it in the same TCP segment.
+                    string first = await reader.ReadLineAsync();
+                    if (first != null)
                     {
-                        string received = Encoding.UTF8.GetString(buffer, 0, bytesRead);
-                        var doc = JsonDocument.Parse(received);
+                        using var doc = JsonDocument.Parse(first);
                         if (doc.RootElement.TryGetProperty("id", out var idProp))
                         {
                             picoId = idProp.GetString();
@@ -158,10 +160,10 @@ namespace RVNetworkLibrary.Services
                     // Main receive loop
                     while (true)
                     {
-                        int loopBytesRead = await stream.ReadAsync(buffer, 0, buffer.Length);
-                        if (loopBytesRead == 0) break; // Client disconnected
+                        string received = await reader.ReadLineAsync();
+                        if (received == null) break; // Client disconnected
+                        if (received.Length == 0) continue;
 
-                        string received = Encoding.UTF8.GetString(buffer, 0, loopBytesRead);
                         Console.WriteLine($"[TCP] Received from {picoId}: {received}");
 
                         // TODO: Parse message, update status, send commands, etc.